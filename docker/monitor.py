@@ -6,35 +6,137 @@ Terry N. Brown terrynbrown@gmail.com Sat 04 Apr 2020 09:30:09 PM NZDT
 
 import json
 import os
+import queue
+import select
+import signal
 import subprocess
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 
 from run_itassets import update
 
+DEBOUNCE = 1.5  # seconds to wait for more pushes before rebuilding
+PULL_TIMEOUT = 60  # seconds before a hung `git pull` is killed
+PENDING = None  # threading.Timer for the next rebuild
+PENDING_LOCK = threading.Lock()
+# builds waiting for the worker thread, at most one as a waiting build will
+# see all pushes made before it starts
+BUILDS = queue.Queue(maxsize=1)
+
+
+def wait_proc(proc, timeout=None):
+    """Wait for subprocess `proc` to exit, sleeping on a pidfd where
+    available rather than the stdlib's polling wait.  If `timeout` seconds
+    pass first, kill `proc`'s process group and raise
+    subprocess.TimeoutExpired - start `proc` with start_new_session=True so
+    the group is its own, and includes children like `git fetch` and ssh.
+    """
+    try:
+        fd = os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):  # not Linux >= 5.3 / Python >= 3.9
+        fd = None
+    try:
+        if fd is None:
+            return proc.wait(timeout)
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        if not poller.poll(None if timeout is None else timeout * 1000):
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        return proc.wait()
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        proc.wait()
+        raise
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def current_branch(repo):
+    """Name of the checked out branch in `repo`, read from .git/HEAD
+    directly to avoid running `git rev-parse --abbrev-ref HEAD`
+    """
+    try:
+        with open(os.path.join(repo, '.git', 'HEAD')) as head:
+            ref = head.read().strip()
+    except OSError:  # e.g. .git is a file (worktree / submodule)
+        cmd = ['git', '-C', repo, 'rev-parse', '--abbrev-ref', 'HEAD']
+        cmd = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        branch, err = cmd.communicate()
+        return branch.decode('utf-8').strip()
+    if ref.startswith('ref: refs/heads/'):
+        return ref[len('ref: refs/heads/'):]
+    return 'HEAD'  # detached, as rev-parse would report
+
+
+def pull_and_update():
+    """Pull the asset repo. and regenerate outputs"""
+    cmd = ['git', '-C', '/repo', 'pull']
+    env = dict(os.environ)
+    # reuse one ssh connection across pulls, see ControlMaster in ssh_config
+    env['GIT_SSH_COMMAND'] = (
+        'ssh -o StrictHostKeyChecking=no -o ControlMaster=auto'
+        ' -o ControlPath=/tmp/ssh-%r@%h:%p -o ControlPersist=10m'
+    )
+    # own session / process group, so a timeout kills git's children too
+    cmd = subprocess.Popen(cmd, env=env, start_new_session=True)
+    wait_proc(cmd, PULL_TIMEOUT)
+    update("/inputs/*.yaml")
+
+
+def queue_update():
+    """Ask the worker thread for a build, unless one's already waiting"""
+    try:
+        BUILDS.put_nowait(True)
+    except queue.Full:
+        pass
+
+
+def build_worker():
+    """Run queued builds one at a time"""
+    while True:
+        BUILDS.get()
+        try:
+            pull_and_update()
+        except Exception:
+            traceback.print_exc()
+
+
+def schedule_update():
+    """(Re)start the timer for queue_update(), so a burst of pushes
+    results in a single rebuild
+    """
+    global PENDING
+    with PENDING_LOCK:
+        if PENDING is not None:
+            PENDING.cancel()
+        PENDING = threading.Timer(DEBOUNCE, queue_update)
+        PENDING.start()
+
 
 class MyHandler(BaseHTTPRequestHandler):
+    # keep-alive, needs Content-Length on every response
+    protocol_version = "HTTP/1.1"
+    # seconds before an idle connection's handler thread gives up on it
+    timeout = 30
+
     def do_POST(self):
         data = self.rfile.read(int(self.headers['Content-Length']))
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
         # print(data)
         data = json.loads(data)
         # print(data)
-        cmd = ['git', '-C', '/repo', 'rev-parse', '--abbrev-ref', 'HEAD']
-        cmd = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-        branch, err = cmd.communicate()
-        branch = branch.decode('utf-8').strip()
+        branch = current_branch('/repo')
         print(f"Got post, monitoring {branch}")
-        cmd = ['git', '-C', '/repo', 'pull']
-        env = dict(os.environ)
-        env['GIT_SSH_COMMAND'] = 'ssh -o StrictHostKeyChecking=no'
-        cmd = subprocess.Popen(cmd, env=env)
-        out, err = cmd.communicate()
-        update("/inputs/*.yaml")
+        schedule_update()
 
 
 def main():
-    httpd = HTTPServer(('', 8000), MyHandler)
+    threading.Thread(target=build_worker, daemon=True).start()
+    httpd = ThreadingHTTPServer(('', 8000), MyHandler)
     httpd.serve_forever()
 
 
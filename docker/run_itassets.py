@@ -1,16 +1,34 @@
 import glob
+import os
+import re
 import sys
 
 sys.path.append("/itassets")
 import itassets
 
+GLOBS = {}  # pattern -> (folder mtime, matching files), see find_inputs()
+
+
+def find_inputs(pattern):
+    """glob.glob(pattern), only rescanning the folder when its mtime shows
+    files have been added / removed / renamed since the last call
+    """
+    folder = os.path.dirname(pattern) or '.'
+    if re.search(r'[*?[]', folder):  # wildcards in folder, can't cache
+        return glob.glob(pattern)
+    mtime = os.stat(folder).st_mtime_ns
+    if GLOBS.get(pattern, (None,))[0] != mtime:
+        GLOBS[pattern] = mtime, glob.glob(pattern)
+    return GLOBS[pattern][1]
+
 
 def update(inputs):
-    inputs = glob.glob(inputs)
-    cmd = '--output /outputs --theme light --assets'.split() + inputs
-    itassets.generate_all(itassets.get_options(cmd))
-    cmd = '--output /outputs/dark --theme dark --assets'.split() + inputs
-    itassets.generate_all(itassets.get_options(cmd))
+    inputs = find_inputs(inputs)
+    cmd = '--output /outputs --assets'.split() + inputs
+    itassets.generate_all(
+        itassets.get_options(cmd),
+        [('light', '/outputs'), ('dark', '/outputs/dark')],
+    )
 
 
 def main():
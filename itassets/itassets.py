@@ -1,9 +1,19 @@
 import argparse
 import json
+import multiprocessing
 import os
+import pickle
+import queue
 import re
+import subprocess
+import sys
+import threading
 import time
-from collections import defaultdict, namedtuple
+from collections import Counter, defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from io import BytesIO
 from itertools import chain
 from types import SimpleNamespace
 
@@ -13,9 +23,56 @@ import yaml
 
 OPT = SimpleNamespace()  # global (for now) options
 
-AT = namedtuple(
-    "AssetType", "description style color tags fields depends prefix"
-)
+
+@dataclass(frozen=True, slots=True)
+class AT:
+    """An asset type"""
+
+    description: str
+    style: str
+    color: str
+    tags: tuple
+    fields: tuple
+    depends: tuple
+    prefix: str
+
+
+class ArtifactWriter:
+    """Write output files from a background thread, so rendering the next
+    page doesn't wait for the last one to hit the disk.  Call flush() to
+    wait for pending writes, it re-raises the first failed write.
+    """
+
+    def __init__(self):
+        self.pid = None
+        self.queue = None
+        self.error = None
+
+    def write(self, path, text):
+        if self.pid != os.getpid():  # first use, or forked process
+            self.pid = os.getpid()
+            self.queue = queue.Queue()
+            threading.Thread(target=self.run, daemon=True).start()
+        self.queue.put((path, text))
+
+    def run(self):
+        while True:
+            path, text = self.queue.get()
+            try:
+                with open(path, 'w') as out:
+                    out.write(text)
+            except Exception as exc:
+                self.error = self.error or exc
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        if self.queue is not None and self.pid == os.getpid():
+            self.queue.join()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
 
 # shape / color for drawing graphs
 # top => top level node like an application, needs no dependents to
@@ -26,12 +83,12 @@ ASSET_TYPE = {
         '"Terminal" asset type, that users use',
         "shape=oval, width=1.5, rank=max",
         'green',
-        ['top'],
-        ['location', 'owner'],
-        [
+        ('top',),
+        ('location', 'owner'),
+        (
             '(cloud/service|container/.*|vm/virtualbox|'
-            'physical/server/service$|website/static)'
-        ],
+            'physical/server/service$|website/static)',
+        ),
         'app',
     ),
     # application/internal same as external except peripheries=2
@@ -39,74 +96,74 @@ ASSET_TYPE = {
         '"Terminal" asset type, that users use',
         "shape=oval, width=1.5, rank=max, peripheries=2",
         'green',
-        ['top'],
-        ['location', 'owner'],
-        [
+        ('top',),
+        ('location', 'owner'),
+        (
             '(cloud/service|container/.*|vm/virtualbox|'
-            'physical/server/service$|website/static)'
-        ],
+            'physical/server/service$|website/static)',
+        ),
         'app',
     ),
     'backup': AT(
         "A backup solution",
         'shape=component, width=1.5',
         'white',
-        [],
-        ['location'],
-        [],
+        (),
+        ('location',),
+        (),
         'bak',
     ),
     'cloud/service': AT(
         "A service (web-server, RDMS) running in the cloud",
         'shape=polygon, width=1.25, sides=9',
         'pink',
-        [],
-        ['location'],
-        ['resource/deployment'],
+        (),
+        ('location',),
+        ('resource/deployment',),
         'csvc',
     ),
     'container/docker': AT(
         "A docker container (image instance)",
         'shape="box3d", width=1.5',
         'green',
-        [],
-        [],
-        [
+        (),
+        (),
+        (
             'resource/deployment',
             '(physical/server|cloud/service)',
             'storage/.*',
-        ],
+        ),
         'con',
     ),
     'database': AT(
         "A database on a server",
         "shape=house",
         "white",
-        [],
-        [],
-        [
+        (),
+        (),
+        (
             '(cloud/service|container/.*|vm/virtualbox|'
             'physical/server/service$)',
             'backup',
-        ],
+        ),
         'db',
     ),
     'drive': AT(
         "A physical drive",
         'shape=cylinder, width=1.25',
         'cyan',
-        [],
-        ['location', 'size'],
-        ['physical/server'],
+        (),
+        ('location', 'size'),
+        ('physical/server',),
         'drv',
     ),
     'physical/server': AT(
         "A real physical server",
         'shape=box, width=1',
         'gray',
-        ['bottom'],
-        [],
-        [],
+        ('bottom',),
+        (),
+        (),
         'srv',
     ),
     # e.g. a non-containerized Django app., c.f. /infrastructure variant below
@@ -115,9 +172,9 @@ ASSET_TYPE = {
         " on a physical server",
         'shape=pentagon, width=1.25',
         'pink',
-        [],
-        [],
-        ['physical/server', 'resource/deployment', 'storage/.*'],
+        (),
+        (),
+        ('physical/server', 'resource/deployment', 'storage/.*'),
         'psvc',
     ),
     # /infrastructure denotes the "core" HTTP etc. service on a server
@@ -126,9 +183,9 @@ ASSET_TYPE = {
         " on a physical server",
         'shape=octagon, width=1.25',
         'pink',
-        [],
-        [],
-        ['physical/server', 'resource/deployment', 'storage/.*'],
+        (),
+        (),
+        ('physical/server', 'resource/deployment', 'storage/.*'),
         'psvc',
     ),
     'resource/deployment': AT(
@@ -136,41 +193,54 @@ ASSET_TYPE = {
         "e.g. the Dockerfile for a Docker image",
         'shape=note, width=1.5',
         'cyan',
-        ['bottom'],
-        ['location'],
-        [],
+        ('bottom',),
+        ('location',),
+        (),
         'dply',
     ),
     'storage/local': AT(
         "A local storage solutions, requires backup",
         'shape=folder,width=1.5',
         'white',
-        [],
-        ['location'],
-        ['backup', 'drive'],
+        (),
+        ('location',),
+        ('backup', 'drive'),
         'sto',
     ),
     'vm/virtualbox': AT(
         "A VirtualBox VM",
         'shape=box, peripheries="2", width=1.4',
         'pink',
-        [],
-        [],
-        ['physical/server', 'storage/.*'],
+        (),
+        (),
+        ('physical/server', 'storage/.*'),
         'vbx',
     ),
     'website/static': AT(
         "A static website, may include javascript",
         'shape=tab,width=1',
         'white',
-        [],
-        ['location'],
-        ['resource/deployment', 'storage/.*', 'physical/server/service'],
+        (),
+        ('location',),
+        ('resource/deployment', 'storage/.*', 'physical/server/service'),
         'wss',
     ),
 }
 
 ID_PREFIX = {v.prefix: v.description for v in ASSET_TYPE.values()}
+# (pattern, compiled pattern) for each asset type's `depends`
+DEPENDS_COMPILED = {
+    k: [(i, re.compile(i)) for i in v.depends] for k, v in ASSET_TYPE.items()
+}
+# asset types tagged top / bottom, for the dependents / dependencies checks
+TOP_TYPES = frozenset(k for k, v in ASSET_TYPE.items() if 'top' in v.tags)
+BOTTOM_TYPES = frozenset(
+    k for k, v in ASSET_TYPE.items() if 'bottom' in v.tags
+)
+# ASSET_TYPE as dicts with their `id`, for the asset_types report
+ASSET_TYPE_LIST = [dict(asdict(v), id=k) for k, v in ASSET_TYPE.items()]
+# space separated words starting like http://, see link_links()
+URL_RE = re.compile(r'(?<![^ \n])\w+://[^ \n]*')
 # fields treated as lists on report output
 LIST_FIELDS = (
     'closed_issues',
@@ -213,8 +283,25 @@ DARK_THEME.update(
     )
 )
 
-VALIDATORS = defaultdict(lambda: [])
-VALIDATORS_COMPILED = {}  # updated in main()
+VALIDATORS = defaultdict(list)
+VALIDATORS_COMPILED = {}  # compiled VALIDATORS keys, see validator()
+
+# parsed YAML by path, for repeat runs in one process, see load_assets()
+YAML_CACHE = {}
+# stale YAML needed to make parsing in worker processes pay, see
+# preload_yaml(), process start up costs more than parsing small files
+PRELOAD_BYTES = 4 * 1024 * 1024
+# libyaml based loader if available, much faster than pure Python
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+# output files are written in the background, see ArtifactWriter
+WRITER = ArtifactWriter()
+# worker processes don't fork() the caller directly, which may have other
+# threads (docker/monitor.py) holding locks the child would inherit
+MP_CONTEXT = multiprocessing.get_context(
+    'forkserver'
+    if 'forkserver' in multiprocessing.get_all_start_methods()
+    else 'spawn'
+)
 
 
 def validator(type_):
@@ -228,6 +315,9 @@ def validator(type_):
 
     def add_validator(function, type_=type_):
         VALIDATORS[type_].append(function)
+        # same list under the compiled pattern, compiled once at import
+        VALIDATORS_COMPILED.setdefault(re.compile(type_), VALIDATORS[type_])
+        return function
 
     return add_validator
 
@@ -237,8 +327,9 @@ def validator(type_):
 # do this first, as it may explain subsequent KeyErrors
 @validator('.*')
 def known_asset_type(asset, lookup, dependents):
-    if asset.get('type') not in ASSET_TYPE:
-        yield 'ERROR', f"Has unknown type {asset.get('type')}"
+    type_ = asset.get('type')
+    if type_ not in ASSET_TYPE:
+        yield 'ERROR', f"Has unknown type {type_}"
 
 
 @validator('.*')
@@ -251,7 +342,7 @@ def no_undef_depends(asset, lookup, dependents):
 
 @validator('.*')
 def known_id_prefix(asset, lookup, dependents):
-    if asset['id'].split('_')[0] not in ID_PREFIX:
+    if asset['id'].split('_', 1)[0] not in ID_PREFIX:
         yield 'WARNING', "Has unknown prefix"
 
 
@@ -260,17 +351,14 @@ def dependents_if_not_top(asset, lookup, dependents):
     if (
         asset['id'] not in dependents
         and 'type' in asset
-        and 'top' not in ASSET_TYPE[asset['type']].tags
+        and asset['type'] not in TOP_TYPES
     ):
         yield 'WARNING', "Non-top-level asset has no dependents"
 
 
 @validator('.*')
 def dependencies_if_not_bottom(asset, lookup, dependents):
-    if (
-        not asset.get('depends_on')
-        and 'bottom' not in ASSET_TYPE[asset['type']].tags
-    ):
+    if not asset.get('depends_on') and asset['type'] not in BOTTOM_TYPES:
         yield 'WARNING', "Non-bottom-level asset has no dependencies"
 
 
@@ -298,17 +386,33 @@ def check_fields(asset, lookup, dependents):
 def check_depends(asset, lookup, dependents):
     """Check asset lists dependencies specified in its definition"""
     type_ = asset['type']
+    dep_ids = asset_dep_ids(asset)
+    # depends patterns met by any dependency, via their types
+    met = set()
+    for i in asset_dep_ids(asset, insufficient=True):
+        dep_type = lookup[i]['type'] if i in lookup else "NO-TYPE"
+        met |= depends_met(type_, dep_type)
     for dep in ASSET_TYPE[type_].depends:
-        if '^' + dep in asset_dep_ids(asset):
+        if '^' + dep in dep_ids:
             yield 'NOTE', f"Specifically excludes '{dep}' dependency"
             continue
-        if not any(
-            re.search(dep, lookup.get(i, {'type': "NO-TYPE"})['type'])
-            for i in asset_dep_ids(asset, insufficient=True)
-        ):
+        if dep not in met:
             yield 'WARNING', f"'{type_}' should define '{dep}' dependency"
 
 
+@lru_cache(maxsize=None)
+def depends_met(type_, dep_type):
+    """The `depends` patterns of asset type `type_` that a dependency of
+    type `dep_type` satisfies, there are few distinct type pairs
+    """
+    return frozenset(
+        dep
+        for dep, dep_re in DEPENDS_COMPILED[type_]
+        if dep_re.search(dep_type)
+    )
+
+
+@lru_cache(maxsize=None)  # parsers are reusable, repeat runs in one process
 def make_parser():
 
     parser = argparse.ArgumentParser(
@@ -367,10 +471,31 @@ def get_options(args=None):
     return opt
 
 
+@lru_cache(maxsize=None)
 def get_jinja():
-    """Get Jinja environment for rendering templates"""
+    """Get Jinja environment for rendering templates, shared so compiled
+    templates are reused
+    """
     path = os.path.join(os.path.dirname(__file__), 'templates')
-    return jinja2.Environment(loader=jinja2.FileSystemLoader([path]))
+    # compiled templates are kept between runs in a per-user temp. dir., if
+    # one can be made (not on a read-only / shared-with-other-owner /tmp)
+    try:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+    except (OSError, RuntimeError):
+        bytecode_cache = None
+    # templates don't change during a run, no need to stat them on each use
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader([path]),
+        auto_reload=False,
+        cache_size=-1,
+        bytecode_cache=bytecode_cache,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    """Get compiled template `name`, looked up once per run"""
+    return get_jinja().get_template(name)
 
 
 def load_assets(asset_file):
@@ -378,16 +503,72 @@ def load_assets(asset_file):
 
     Returns list of assets, adds link from each asset to dict representing
     whole file.
+
+    Parsed data is cached (pickled, so each call gets a fresh copy to
+    annotate) against the file's mtime and size in YAML_CACHE.
     """
-    file_data = yaml.safe_load(open(asset_file))
+    path = os.path.abspath(asset_file)
+    cached = YAML_CACHE.get(path)
+    if not cached or cached[0] != yaml_cache_key(asset_file):
+        cached = YAML_CACHE[path] = read_yaml(asset_file)
+    file_data = pickle.loads(cached[1])
     if not file_data:
         return []
     for asset in file_data.get('assets', []):
         asset['file_data'] = file_data
-    file_data['file_path'] = os.path.abspath(asset_file)
+        # used as dict keys throughout, interned so lookups compare by
+        # identity, as do the dependency IDs from asset_dep_ids()
+        for field in 'id', 'type':
+            if isinstance(asset.get(field), str):
+                asset[field] = sys.intern(asset[field])
+    file_data['file_path'] = path
     return file_data['assets']
 
 
+def yaml_cache_key(asset_file):
+    """YAML_CACHE entries are valid while the file's mtime and size match"""
+    stat = os.stat(asset_file)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_yaml(asset_file):
+    """Parse YAML file, return (YAML_CACHE key, pickled data)"""
+    key = yaml_cache_key(asset_file)
+    with open(asset_file, 'rb') as in_file:
+        file_data = yaml.load(in_file, Loader=YAML_LOADER)
+    return key, pickle.dumps(file_data)
+
+
+def preload_yaml(asset_files):
+    """Parse asset files not current in YAML_CACHE in worker processes,
+    libyaml holds the GIL so threads don't parse in parallel
+    """
+    cpus = os.cpu_count() or 1
+    if cpus <= 1:
+        return
+    stale = []
+    stale_bytes = 0
+    for asset_file in dict.fromkeys(asset_files):
+        try:
+            cached = YAML_CACHE.get(os.path.abspath(asset_file))
+            key = yaml_cache_key(asset_file)
+        except OSError:
+            continue  # reported when load_assets() reads it
+        if not cached or cached[0] != key:
+            stale.append(asset_file)
+            stale_bytes += key[1]
+    if len(stale) < 2 or stale_bytes < PRELOAD_BYTES:
+        return  # not worth starting processes
+    workers = min(len(stale), cpus)
+    with ProcessPoolExecutor(workers, mp_context=MP_CONTEXT) as pool:
+        parsing = [pool.submit(read_yaml, i) for i in stale]
+    for asset_file, parsed in zip(stale, parsing):
+        try:
+            YAML_CACHE[os.path.abspath(asset_file)] = parsed.result()
+        except Exception:
+            pass  # reported when load_assets() reads it
+
+
 def general_info(assets):
     """Search the assets for a general section, used for overall title"""
     for asset in assets:
@@ -398,99 +579,203 @@ def general_info(assets):
     return None
 
 
-def validate_assets(assets):
-    """Print validation errors and return mapping from asset to errors"""
-    seen = {}
-    dependents = defaultdict(lambda: [])
+def dependents_index(assets):
+    """Map each asset ID to the IDs of assets that depend on it (including
+    IDs depended on but not defined)
+    """
+    dependents = defaultdict(list)
+    for asset in assets:
+        try:
+            id_ = asset['id']
+            deps = asset_dep_ids(asset)
+        except Exception:
+            continue  # reported by validate_assets()
+        for dep in deps:
+            dependents[dep].append(id_)
+    return dependents
+
+
+def dependency_cycles(lookup):
+    """Return set of IDs of assets in circular dependencies, i.e. in strongly
+    connected components of more than one asset, or depending on
+    themselves.  Tarjan's algorithm, iterative rather than recursive.
+    """
+    index = {}  # visit order of each ID
+    low = {}  # lowest index reachable from each ID
+    stack = []  # visited IDs not yet assigned to a component
+    on_stack = set()
+    cyclic = set()
+    for root in lookup:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(asset_dep_ids(lookup[root])))]
+        while work:
+            id_, deps = work[-1]
+            for dep in deps:
+                if dep not in lookup:
+                    continue
+                if dep not in index:  # descend
+                    index[dep] = low[dep] = len(index)
+                    stack.append(dep)
+                    on_stack.add(dep)
+                    work.append((dep, iter(asset_dep_ids(lookup[dep]))))
+                    break
+                if dep in on_stack:
+                    low[id_] = min(low[id_], index[dep])
+            else:  # all dependencies done
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[id_])
+                if low[id_] == index[id_]:  # id_ is root of a component
+                    component = []
+                    while not component or component[-1] != id_:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    if len(component) > 1 or id_ in asset_dep_ids(lookup[id_]):
+                        cyclic.update(component)
+    return cyclic
+
+
+def validate_assets(assets, dependents):
+    """Print validation errors and return mapping from asset to errors,
+    `dependents` is from dependents_index()
+    """
     failures = {}
-    # check for duplicate IDs, dependents
-    duplicate_IDs = False
     for asset in assets:
         try:
+            asset['id']
+            asset_dep_ids(asset)
+        except Exception:
+            print(f"Failed validating {asset}")
+    identified = [i for i in assets if 'id' in i]
+    # first asset with each ID
+    seen = {i['id']: i for i in reversed(identified)}
+    # check for duplicate IDs
+    counts = Counter(i['id'] for i in identified)
+    if len(counts) < len(identified):
+        for asset in identified:
             id_ = asset['id']
-            if id_ in seen:
-                duplicate_IDs = True
+            if counts[id_] > 1 and seen[id_] is not asset:
                 print(f"ERROR: {id_} already seen")
                 print(f"  First used in {seen[id_]['file_data']['file_path']}")
                 print(f"  Duplicated in {asset['file_data']['file_path']}")
-            else:
-                seen[id_] = asset
-            for dep in asset_dep_ids(asset):
-                dependents[dep].append(id_)
-        except Exception:
-            print(f"Failed validating {asset}")
-    if duplicate_IDs:
         raise Exception("Can't continue with duplicate IDs present")
 
+    cyclic = dependency_cycles(seen)
+
     # apply validation functions to each asset
-    for asset in assets:
-        issues = [('UNKNOWN', 'FAILURE')]
-        # Having something on this list makes sure the finally clause prints
-        # something to incriminate the failing asset if there's an exception
-        # before anything's added to issues.
-        try:
-            # all validators matching asset type
-            for pattern, validators in VALIDATORS_COMPILED.items():
-                if pattern.search(asset.get('type', 'NOT-SPECIFIED')):
-                    for validator in validators:
-                        issues.extend(list(validator(asset, seen, dependents)))
-            assert issues[0] == ('UNKNOWN', 'FAILURE')
-            del issues[0]  # remove this, see comment above
-        finally:
-            if issues:
-                failures[asset['id']] = issues
-                print(
-                    f"\nASSET: {asset['id']} '{asset.get('name')}'"
-                    f"\n       in {asset['file_data']['file_path']}"
-                )
-            for type_, description in issues:
-                print(f"    {type_}: {description}")
+    type_validators = {}  # asset type -> validators matching it
+    report = []  # printed in one go at the end
+    try:
+        for asset in assets:
+            issues = []
+            try:
+                # all validators matching asset type
+                asset_type = asset.get('type', 'NOT-SPECIFIED')
+                if asset_type not in type_validators:
+                    type_validators[asset_type] = [
+                        validator
+                        for pattern, validators in VALIDATORS_COMPILED.items()
+                        if pattern.search(asset_type)
+                        for validator in validators
+                    ]
+                    if asset_type not in ASSET_TYPE:
+                        # the rest would just fail looking up the type
+                        type_validators[asset_type] = [known_asset_type]
+                for validator in type_validators[asset_type]:
+                    issues.extend(validator(asset, seen, dependents))
+                if asset['id'] in cyclic:
+                    issues.append(('WARNING', "In a circular dependency"))
+            except Exception:
+                # makes sure the finally clause reports something to
+                # incriminate the failing asset even if nothing was added to
+                # issues
+                issues.insert(0, ('UNKNOWN', 'FAILURE'))
+                raise
+            finally:
+                if issues:
+                    failures[asset['id']] = issues
+                    report.append(
+                        f"\nASSET: {asset['id']} '{asset.get('name')}'"
+                        f"\n       in {asset['file_data']['file_path']}"
+                    )
+                for type_, description in issues:
+                    report.append(f"    {type_}: {description}")
+    finally:
+        if report:
+            print('\n'.join(report))
 
     return failures
 
 
-def propagate_dependent(assets, output='_dependent_types', field='type'):
+def propagate_dependent(
+    assets, fields=(('_dependent_types', 'type'),), dependents=None
+):
     """Add a `_dependent_types` set to all assets which lists the types of
     assets dependent on this asset, to generate trimmed maps with --leaf-type.
-    """
-    # FIXME: catch circular dependencies
-    lookup = {i['id']: i for i in assets}
-
-    def add_types(asset, type_, lookup):
-        asset.setdefault(output, set()).add(type_)
-        for depend in asset_dep_ids(asset):
-            if depend in lookup:
-                add_types(lookup[depend], type_, lookup)
-
-    for asset in assets:
-        add_types(asset, asset[field], lookup)
-
-
-def node_dot(id_, attr):
-    """Format graphviz dot node definition"""
-    return "  {id} [{attrs}]".format(
-        id=id_,
-        attrs=', '.join(
-            (f'{k}="{v}"' if k else v[0]) for k, v in attr.items()
-        ),
-    )
-
 
+    `fields` is (output, field) pairs, all propagated in one traversal.
+    `dependents` is from dependents_index(), built here if not supplied.
+    """
+    if dependents is None:
+        dependents = dependents_index(assets)
+    # the traversal works on list positions rather than asset dicts / IDs
+    index = {i['id']: n for n, i in enumerate(assets)}
+    depends = [
+        [index[j] for j in asset_dep_ids(i) if j in index] for i in assets
+    ]
+    # number of (not yet visited) dependents of each asset
+    waiting = [len(dependents.get(i['id'], ())) for i in assets]
+    values = []  # for each output, each asset's set
+    for output, field in fields:
+        for asset in assets:
+            asset.setdefault(output, set()).add(asset[field])
+        values.append([i[output] for i in assets])
+
+    # visit each asset after all its dependents, passing on their values
+    ready = [n for n, i in enumerate(waiting) if not i]
+    while ready:
+        n = ready.pop()
+        for depend in depends[n]:
+            for sets in values:
+                sets[depend] |= sets[n]
+            waiting[depend] -= 1
+            if not waiting[depend]:
+                ready.append(depend)
+
+    # circular dependencies (and their dependencies) are never ready, so
+    # just pass values along their edges until nothing changes
+    cyclic = [n for n, i in enumerate(waiting) if i]
+    changed = True
+    while changed:
+        changed = False
+        for n in cyclic:
+            for depend in depends[n]:
+                for sets in values:
+                    if not sets[n] <= sets[depend]:
+                        sets[depend] |= sets[n]
+                        changed = True
+
+
+@lru_cache(maxsize=None)
 def dot_node_name(text):
-    """Handle wide node names"""
+    """Handle wide node names, breaking at the space / _ / - closest to the
+    middle (preferring the right at equal distance)
+    """
     hlen = len(text) // 2
     if hlen <= 8:
         return text
-    i = 0
-    at = None
-    while i < hlen - 1:
-        if text[hlen + i] in ' _-':
-            at = hlen + i
-            break
-        if text[hlen - i] in ' _-':
-            at = hlen - i
-            break
-        i += 1
+    right = [text.find(i, hlen, 2 * hlen - 1) for i in ' _-']
+    right = [i for i in right if i != -1]
+    left = [text.rfind(i, 2, hlen + 1) for i in ' _-']
+    left = [i for i in left if i != -1]
+    at = min(right) if right else None
+    if left and (at is None or hlen - max(left) < at - hlen):
+        at = max(left)
     if at is not None:
         return text[:at] + '\\n' + text[at:]
     return text
@@ -498,27 +783,23 @@ def dot_node_name(text):
 
 def link_links(text):
     """Add <a/> elements in output for http://... text in notes etc."""
-    lines = text.split('\n')
-    for line_i, line in enumerate(lines):
-        lines[line_i] = line.replace('<', '&lt;')
-        if re.search(r'\w+://', line):
-            words = [
-                f"<a href={i} target='_blank'>{i}</a>"
-                if re.match(r'\w+://', i)
-                else i
-                for i in line.split(' ')
-            ]
-            lines[line_i] = ' '.join(words)
-    return '\n'.join(lines)
+    text = text.replace('<', '&lt;')
+    if '://' not in text:  # most fields, no URLs to link
+        return text
+    return URL_RE.sub(r"<a href=\g<0> target='_blank'>\g<0></a>", text)
 
 
 def html_filename(asset):
     """Name of .html file containing info. on asset"""
+    if '_reppath' in asset:  # set once in prep_assets()
+        return asset['_reppath']
     return '_'.join(asset['id'].split()) + '.html'
 
 
 def edit_url(asset):
     """URL (custom protocol) for invoking editor for asset definition"""
+    if '_edit_url' in asset:  # set once in prep_assets()
+        return asset['_edit_url']
     if not asset.get('file_data'):
         return None  # a node for an undefined dependency
     return f"itas://{asset['file_data']['file_path']}#{asset['id']}"
@@ -526,25 +807,28 @@ def edit_url(asset):
 
 def dep_types(asset):
     """list of short types of immediate dependencies"""
-    deps = [i for i in asset_dep_ids(asset) if not i.startswith('^')]
-    return [i.split('_')[0] for i in deps]
+    return [i.split('_', 1)[0] for i in real_dep_ids(asset)]
 
 
 def report_to_html(asset, lookup, issues, title, write=True, dep_map=True):
     """Generate HTML describing asset, possibly write to file"""
-    keys = {
-        k: link_links(asset[k])
-        for k in asset
-        if not k.startswith('_') and isinstance(asset[k], str)
-    }
-    keys['defined_in'] = asset['file_data']['file_path']
-    lists = {
-        k: [link_links(i) for i in v]
-        for k, v in asset.items()
-        if not k.startswith('_')
-        and isinstance(asset[k], list)
-        and k != 'depends_on'
-    }
+    # linked text of fields doesn't change between themes / listings
+    if '_keys' not in asset:
+        asset['_keys'] = {
+            k: link_links(asset[k])
+            for k in asset
+            if not k.startswith('_') and isinstance(asset[k], str)
+        }
+        asset['_keys']['defined_in'] = asset['file_data']['file_path']
+        asset['_lists'] = {
+            k: [link_links(i) for i in v]
+            for k, v in asset.items()
+            if not k.startswith('_')
+            and isinstance(asset[k], list)
+            and k != 'depends_on'
+        }
+    keys = asset['_keys']
+    lists = asset['_lists']
     Link = namedtuple("Link", 'link text')
     dependencies = []
     for txt in asset.get('depends_on', []):
@@ -553,9 +837,7 @@ def report_to_html(asset, lookup, issues, title, write=True, dep_map=True):
             dependencies.append(
                 Link(
                     html_filename(lookup[id_]),
-                    lookup[id_]['type']
-                    + ':'
-                    + lookup[id_]['name']
+                    lookup[id_]['_link_text']
                     + ' '
                     + ' '.join(txt.split()[1:]),
                 )
@@ -574,10 +856,7 @@ def report_to_html(asset, lookup, issues, title, write=True, dep_map=True):
              """
 
         return [
-            Link(
-                html_filename(lookup[id_]),
-                lookup[id_]['type'] + ':' + lookup[id_]['name'],
-            )
+            Link(html_filename(lookup[id_]), lookup[id_]['_link_text'])
             for id_ in links
             if id_ in lookup  # absent in trimmed graph maybe
         ]
@@ -585,24 +864,23 @@ def report_to_html(asset, lookup, issues, title, write=True, dep_map=True):
     dependents = existing_links(asset['_dependents'], lookup)
     all_deps = set()
     finals = set()
-    checked = set()
-    to_check = list(asset['_dependents'])
+    to_check = deque(asset['_dependents'])
+    queued = set(to_check)  # everything ever put in to_check
     while to_check:
-        dep = to_check.pop(0)
+        dep = to_check.popleft()
         all_deps.add(dep)
-        checked.add(dep)
         if dep not in lookup:
             continue
         depdeps = lookup[dep]['_dependents']
         if not depdeps:
             finals.add(dep)
-        to_check.extend(
-            [i for i in depdeps if i not in to_check and i not in checked]
-        )
+        for i in depdeps:
+            if i not in queued:
+                queued.add(i)
+                to_check.append(i)
+    direct = set(asset['_dependents'])
     intermediates = [
-        i
-        for i in all_deps
-        if i not in asset['_dependents'] and i not in finals
+        i for i in all_deps if i not in direct and i not in finals
     ]
     intermediates = existing_links(intermediates, lookup)
     finals = existing_links(finals, lookup)
@@ -627,15 +905,14 @@ def report_to_html(asset, lookup, issues, title, write=True, dep_map=True):
     )
 
     if write:
-        template = get_jinja().get_template("asset_def.html")
+        template = get_template("asset_def.html")
     else:
-        template = get_jinja().get_template("asset_block.html")
+        template = get_template("asset_block.html")
 
     html = template.render(context)
 
     if write:
-        with open(OPT.output + '/' + html_filename(asset), 'w') as rep:
-            rep.write(html)
+        WRITER.write(OPT.output + '/' + html_filename(asset), html)
 
     return html
 
@@ -644,26 +921,42 @@ def add_missing_deps(assets, other, ans):
     """Show missing asset definitions in graph (i.e. referenced by ID as a
     dependency but not defined
     """
-    for asset in assets:
-        real_deps = [i for i in asset_dep_ids(asset) if not i.startswith('^')]
-        for dep in real_deps:
-            if dep not in other:
-                ans.append(
-                    f'  n{len(other)} [label="???", shape=doubleoctagon, '
-                    f'fillcolor="{OPT.theme["dot_err_col"]}", style=filled]'
-                )
-                # used just to display missing asset on graph plot
-                other[dep] = {'name': "???", '_node_id': f"n{len(other)}"}
+    # each dependency once, in order of first use
+    deps = dict.fromkeys(chain.from_iterable(map(real_dep_ids, assets)))
+    for dep in deps:
+        if dep not in other:
+            ans.append(
+                f'  n{len(other)} [label="???", shape=doubleoctagon, '
+                f'fillcolor="{OPT.theme["dot_err_col"]}", style=filled]'
+            )
+            # used just to display missing asset on graph plot
+            other[dep] = {'name': "???", '_node_id': f"n{len(other)}"}
 
 
 def asset_dep_ids(asset, insufficient=False):
     """Get list of dependencies, see README for INSUF convention, trailing
-    text split off as it's just commentary"""
-    return [
-        i.split()[0]
-        for i in asset.get('depends_on', [])
-        if (not insufficient or 'INSUF' not in i)
-    ]
+    text split off as it's just commentary.  Cached on the asset as a
+    tuple, as this is called for every asset from many places.
+    """
+    key = '_dep_ids_insufficient' if insufficient else '_dep_ids'
+    if key not in asset:
+        asset[key] = tuple(
+            sys.intern(i.split()[0])
+            for i in asset.get('depends_on', [])
+            if (not insufficient or 'INSUF' not in i)
+        )
+    return asset[key]
+
+
+def real_dep_ids(asset):
+    """asset_dep_ids() without ^excluded standard dependencies, see README,
+    also cached on the asset
+    """
+    if '_real_dep_ids' not in asset:
+        asset['_real_dep_ids'] = tuple(
+            i for i in asset_dep_ids(asset) if i[:1] != '^'
+        )
+    return asset['_real_dep_ids']
 
 
 def get_title(assets):
@@ -678,150 +971,175 @@ def get_title(assets):
 
 def get_tooltip(asset, issues):
     """Hover text in graph view, describes asset"""
-    tooltip = []
-    # add validation issues to top of tooltip
-    tooltip += ["%s %s" % (i, j) for i, j in issues.get(asset['id'], [])]
-    # put asset attributes in tooltip
-    tooltip.extend(
-        [
+    # validation issues at top of tooltip, then the parts that don't vary
+    # between maps, cached on the asset
+    if '_tooltip' not in asset:
+        # put asset attributes in tooltip
+        tooltip = [
             f"{k}: {v}"
             for k, v in asset.items()
             if isinstance(v, str) and not k.startswith('_')
         ]
-    )
-    # put tags etc. in tooltip
-    for list_field in LIST_FIELDS:
-        if asset.get(list_field):
-            tooltip.append(list_field.upper())
-            for item in asset.get(list_field, []):
-                tooltip.append(f"  {item}")
-    # include path to asset def. file in tooltip
-    tooltip.append(f"Defined in {asset['file_data']['file_path']}")
+        # put tags etc. in tooltip
+        for list_field in LIST_FIELDS:
+            if asset.get(list_field):
+                tooltip.append(list_field.upper())
+                for item in asset.get(list_field, []):
+                    tooltip.append(f"  {item}")
+        # include path to asset def. file in tooltip
+        tooltip.append(f"Defined in {asset['file_data']['file_path']}")
+        asset['_tooltip'] = tuple(tooltip)
+    tooltip = ["%s %s" % (i, j) for i, j in issues.get(asset['id'], [])]
+    tooltip.extend(asset['_tooltip'])
     return tooltip
 
 
 def assets_to_dot(assets, issues, title, top):
     """Return graphviz dot format text describing assets"""
-    other = {i['id']: i for i in assets}
+    other = {}
+    for _node_id, asset in enumerate(assets):
+        asset['_node_id'] = f"n{_node_id}"
+        other[asset['id']] = asset
     edit_linked = set()
     ans = [i.format(top=top, title=title) for i in OPT.theme["dot_header"]]
 
     add_missing_deps(assets, other, ans)
+    edit_urls = {k: edit_url(v) for k, v in other.items()}
 
-    for _node_id, asset in enumerate(assets):
-        asset['_node_id'] = f"n{_node_id}"
+    # edge attributes, in graphviz dot [attribute list] format
+    edge_attr = f'fontcolor="{OPT.theme["dot_edit_col"]}"'
+    head_attr = ', headlabel="edit", headtooltip="Edit"'
+    tail_attr = ', taillabel="edit", tailtooltip="Edit"'
     for asset in assets:
+        asset_id = asset['id']
+        node_id = asset['_node_id']
 
         tooltip = get_tooltip(asset, issues)
 
-        # dict of dot / graphviz node attributes
-        attr = dict(
-            label=dot_node_name(asset.get('name')),
-            URL=top + html_filename(asset),
-            target=f"_{asset['id']}",
-        )
+        # graphviz node attributes
+        label = dot_node_name(asset.get('name'))
         if False:  # used to generate demo output
-            attr['label'] = asset['type'].split('/')[-1]
-        # `style` is compound 'shape=box, color=cyan', so key is None
-        attr[None] = (ASSET_TYPE[asset["type"]].style,)
-        if asset['id'] in issues:
-            if any(i[0] != 'NOTE' for i in issues[asset['id']]):
-                attr['style'] = 'filled'
-                attr['fillcolor'] = OPT.theme["dot_err_col"]
-        # tooltip dict -> text
-        attr['tooltip'] = '\\n'.join(tooltip)
+            label = asset['type'].split('/')[-1]
+        # `style` is compound 'shape=box, color=cyan', so included as is
+        style = ASSET_TYPE[asset["type"]].style
+        if asset_id in issues:
+            if any(i[0] != 'NOTE' for i in issues[asset_id]):
+                style += ', style="filled", '
+                style += f'fillcolor="{OPT.theme["dot_err_col"]}"'
+        # tooltip list -> text
+        tooltip = '\\n'.join(tooltip)
 
         # write node to graphviz file
-        ans.append(node_dot(asset['_node_id'], attr))
+        ans.append(
+            f'  {node_id} [label="{label}", '
+            f'URL="{top}{html_filename(asset)}", target="_{asset_id}", '
+            f'{style}, tooltip="{tooltip}"]'
+        )
 
         # write links to graphviz file, FROM dep TO asset
-        for dep in [i for i in asset_dep_ids(asset) if not i.startswith('^')]:
-            attr = dict(fontcolor=OPT.theme['dot_edit_col'])
-            if asset['id'] not in edit_linked:
-                edit_linked.add(asset['id'])
-                attr.update(
-                    dict(
-                        headURL=edit_url(asset),
-                        headlabel='edit',
-                        headtooltip='Edit',
-                    )
-                )
-            if edit_url(other[dep]) and dep not in edit_linked:
+        for dep in real_dep_ids(asset):
+            attr = edge_attr
+            if asset_id not in edit_linked:
+                edit_linked.add(asset_id)
+                attr += f', headURL="{edit_urls[asset_id]}"{head_attr}'
+            dep_url = edit_urls[dep]
+            if dep_url and dep not in edit_linked:
                 # i.e. not an undefined dependency
                 edit_linked.add(dep)
-                attr.update(
-                    dict(
-                        tailURL=edit_url(other[dep]),
-                        taillabel='edit',
-                        tailtooltip='Edit',
-                    )
-                )
-            edge_attr = node_dot('x', attr).split(None, 1)[-1]
-            ans.append(
-                f"  {other[dep]['_node_id']} -> {asset['_node_id']}"
-                f"{edge_attr}"
-            )
+                attr += f', tailURL="{dep_url}"{tail_attr}'
+            ans.append(f"  {other[dep]['_node_id']} -> {node_id}[{attr}]")
 
     ans.append('}')
     return '\n'.join(ans)
 
 
-def make_asset_key(key, asset):
-    """Make node map key images in SVG (rectangle, diamond, etc.)"""
-    ans = [i.format(top='', title='') for i in OPT.theme["dot_header"]]
-    ans += [f"{asset.prefix} [{asset.style}]"]
-    ans += ['}']
-    outfile = f"{OPT.output}/__{key.replace('/', '-')}"
-    with open(f"{outfile}.dot", 'w') as out:
-        out.write('\n'.join(ans))
-    os.system(f"dot -Tsvg -o{outfile}.svg {outfile}.dot")
+def make_asset_keys():
+    """Make node map key images in SVG (rectangle, diamond, etc.) for all
+    asset types, using a single dot process
+    """
+    dots = {}
+    for key, asset in ASSET_TYPE.items():
+        ans = [i.format(top='', title='') for i in OPT.theme["dot_header"]]
+        ans += [f"{asset.prefix} [{asset.style}]"]
+        ans += ['}']
+        outfile = f"{OPT.output}/__{key.replace('/', '-')}"
+        dots[outfile] = '\n'.join(ans)
+        WRITER.write(f"{outfile}.dot", dots[outfile])
+    svgs = run_dots(list(dots.values()))
+    if len(svgs) != len(dots):  # dot failed on some graph, can't pair up
+        for outfile, dot in dots.items():
+            run_dot(dot, f"{outfile}.svg")
+        return
+    for outfile, svg in zip(dots, svgs):
+        WRITER.write(f"{outfile}.svg", svg)
+
+
+def run_dot(dot, svg_file):
+    """Render graphviz `dot` text to `svg_file`, and return the SVG text.
+    The text is passed on stdin, so dot doesn't have to re-read the .dot
+    file written alongside, and the SVG is read from dot's stdout.
+    """
+    svg = subprocess.run(
+        ["dot", "-Tsvg"],
+        input=dot,
+        text=True,
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+    WRITER.write(svg_file, svg)
+    return svg
+
+
+def run_dots(dots):
+    """Render a list of graphviz `dot` texts with one dot process, return
+    list of SVG texts.  dot renders each graph in its input in turn,
+    each SVG document starting with an <?xml declaration.
+    """
+    svg = subprocess.run(
+        ["dot", "-Tsvg"],
+        input='\n'.join(dots),
+        text=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    return ['<?xml' + i for i in svg.split('<?xml')[1:]]
 
 
-def write_reports(assets, issues, title, archived):
+def write_reports(assets, issues, title, archived, lookup):
     """~Query data to make common context for generating various reports,
-    and write HTML reports via templates
+    and write HTML reports via templates, `lookup` is from prep_assets()
     """
-    env = get_jinja()
     generated = title.split(' updated ')[-1]
     applications = [i for i in assets if i['type'].startswith('application/')]
     storage = [i for i in assets if i['type'].startswith('storage/')]
     applications.sort(key=lambda x: (x['type'], x['name']))
     storage.sort(key=lambda x: x['location'])
     archived.sort(key=lambda x: x['name'])
-    lookup = {i['id']: i for i in assets}
     archived_listings = [
         report_to_html(i, lookup, issues, title, write=False, dep_map=False)
         for i in archived
     ]
-    asset_types = []
-    for key, asset in ASSET_TYPE.items():
-        asset_types.append(asset._asdict())
-        asset_types[-1]['id'] = key
-        make_asset_key(key, asset)
-    # types of issues
-    issue_counts = set(j[0] for i in issues.values() for j in i)
-    # count of each type
-    issue_counts = {
-        i: len([j for k in issues.values() for j in k if j[0] == i])
-        for i in issue_counts
-    }
+    make_asset_keys()
+    # count of each type of issue
+    issue_counts = Counter(j[0] for i in issues.values() for j in i)
     context = dict(
         applications=applications,
         archived=archived,
         archived_listings=archived_listings,
         assets=assets,
-        asset_types=asset_types,
+        asset_types=ASSET_TYPE_LIST,
         generated=generated,
         issue_counts=sorted((k, v) for k, v in issue_counts.items()),
         issues=issues,
-        lookup={i['id']: i for i in assets},
+        lookup=lookup,
         storage=storage,
         theme=OPT.theme,
         title=title,
         top='',
     )
-    with open(f"{OPT.output}/index.html", 'w') as out:
-        out.write(env.get_template("map.html").render(context))
+    WRITER.write(
+        f"{OPT.output}/index.html",
+        get_template("map.html").render(context),
+    )
 
     for rep in (
         'applications',
@@ -831,50 +1149,72 @@ def write_reports(assets, issues, title, archived):
         'storage',
         'validation',
     ):
-        with open(f"{OPT.output}/_{rep}.html", 'w') as out:
-            out.write(env.get_template(f"{rep}.html").render(context))
+        WRITER.write(
+            f"{OPT.output}/_{rep}.html",
+            get_template(f"{rep}.html").render(context),
+        )
 
 
 def write_maps(assets, issues, title):
     """Use graphviz dot to make SVG graphs / maps"""
     # main graph of everything
-    write_map(
-        base="index",
-        assets=assets,
-        issues=issues,
-        title=title,
-        leads_to=".*",
-        in_field="_dependent_types",
-    )
+    maps = [dict(base="index", leads_to=".*", in_field="_dependent_types")]
     # assets not leading to applications
-    write_map(
-        base="_unapplied",
-        assets=assets,
-        issues=issues,
-        title=title,
-        leads_to="application/.*",
-        in_field="_dependent_types",
-        negate=True,
+    maps.append(
+        dict(
+            base="_unapplied",
+            leads_to="application/.*",
+            in_field="_dependent_types",
+            negate=True,
+        )
     )
+    # assets by each of their _dependent_types / _dependent_ids values, so
+    # the per-type and per-application maps don't each rescan all assets
+    leading_to = {
+        '_dependent_types': defaultdict(list),
+        '_dependent_ids': defaultdict(list),
+    }
+    for asset in assets:
+        for in_field, index in leading_to.items():
+            for value in asset.get(in_field) or []:
+                index[value].append(asset)
     # maps of all assets of a particular type, shows their dependencies
     for type_ in ASSET_TYPE:
-        write_map(
-            base="_" + type_.replace('/', '_'),
-            assets=assets,
-            issues=issues,
-            title=title,
-            leads_to=type_,
-            in_field="_dependent_types",
+        maps.append(
+            dict(
+                base="_" + type_.replace('/', '_'),
+                leads_to=type_,
+                in_field="_dependent_types",
+                use=leading_to['_dependent_types'].get(type_, []),
+            )
         )
     # individual maps for each application showing dependencies
     for app in [i for i in assets if i['type'].startswith('application/')]:
+        maps.append(
+            dict(
+                base="_" + app['id'],
+                leads_to=app['id'],
+                in_field="_dependent_ids",
+                use=leading_to['_dependent_ids'].get(app['id'], []),
+            )
+        )
+
+    # DOT text has to be made one map at a time, assets_to_dot() sets
+    # _node_id on the assets, but the dot runs can overlap
+    dots = [
+        map_dot(assets=assets, issues=issues, title=title, **map_)
+        for map_ in maps
+    ]
+    svg_files = [f"{OPT.output}/{map_['base']}.svg" for map_ in maps]
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+        svgs = list(pool.map(run_dot, dots, svg_files))
+    for map_, svg in zip(maps, svgs):
         write_map(
-            base="_" + app['id'],
-            assets=assets,
-            issues=issues,
+            base=map_['base'],
             title=title,
-            leads_to=app['id'],
-            in_field="_dependent_ids",
+            leads_to=map_['leads_to'],
+            svg=svg,
+            negate=map_.get('negate', False),
         )
 
 
@@ -883,55 +1223,76 @@ def asset_to_svg(svg):
 
     graphviz dot doesn't use the supplied node ID as the SVG ID
     """
-    dom = etree.fromstring(svg.encode('utf-8'))
-    nodes = dom.xpath(
-        "//svg:g[@id='graph0']/svg:g",
-        namespaces={
-            'svg': "http://www.w3.org/2000/svg",
-            'xlink': "http://www.w3.org/1999/xlink",
-        },
-    )
     a2s = {}
-    for node in nodes:
-        target = node.xpath(".//@target")
-        if target:
-            a2s[target[0][1:]] = node.get('id')
+    depth = 0  # svg element is 1, graph0 2, nodes 3
+    in_graph = False
+    node_id = None
+    events = etree.iterparse(
+        BytesIO(svg.encode('utf-8')), events=('start', 'end')
+    )
+    for event, elem in events:
+        if event == 'end':
+            depth -= 1
+            if depth == 2:  # done with node, free its subtree
+                elem.clear()
+            continue
+        depth += 1
+        if depth == 2:
+            in_graph = elem.get('id') == 'graph0'
+        elif depth == 3:
+            node_id = elem.get('id') if in_graph else None
+        elif node_id is not None and elem.get('target') is not None:
+            a2s[elem.get('target')[1:]] = node_id
+            node_id = None  # first target in node only
     return a2s
 
 
-def write_map(base, assets, issues, title, leads_to, in_field, negate=False):
-    """Output HTML containing SVG graph of assets, see write_maps()"""
-    use = [
-        i
-        for i in assets
-        if any(re.search(f'^{leads_to}$', j) for j in (i.get(in_field) or []))
-    ]
+def map_dot(
+    base, assets, issues, title, leads_to, in_field, negate=False, use=None
+):
+    """Write and return DOT for a map of assets, see write_maps()
+
+    `use`, if given, is the assets with `leads_to` in their `in_field`,
+    already looked up by the caller.
+    """
+    if use is None:
+        leads_to_re = re.compile(f'^{leads_to}$')
+        use = [
+            i
+            for i in assets
+            if any(leads_to_re.search(j) for j in (i.get(in_field) or []))
+        ]
     if negate:
         lookup = {i['id']: i for i in assets}
-        use = [i for i in assets if i not in use]
-        old_len = None
-        while old_len != len(use):
-            for asset in list(use):
-                for dep in asset_dep_ids(asset):
-                    if dep in lookup and lookup[dep] not in use:
-                        use.append(lookup[dep])
-            print(f"Added {len(use)-(old_len or 0)}")
-            old_len = len(use)
+        leading_ids = {i['id'] for i in use}
+        use = [i for i in assets if i['id'] not in leading_ids]
+        # add everything the remaining assets depend on, breadth first
+        n_unused = len(use)
+        use_ids = {i['id'] for i in use}
+        to_check = deque(use)
+        while to_check:
+            for dep in asset_dep_ids(to_check.popleft()):
+                if dep in lookup and dep not in use_ids:
+                    use_ids.add(dep)
+                    use.append(lookup[dep])
+                    to_check.append(lookup[dep])
+        print(f"Added {len(use) - n_unused}")
 
     print(f"Showing {len(use)} of {len(assets)} assets for {base}")
 
-    top = ''
-    with open(f"{OPT.output}/{base}.dot", 'w') as out:
-        out.write(assets_to_dot(use, issues, title, top))
+    dot = assets_to_dot(use, issues, title, '')
+    WRITER.write(f"{OPT.output}/{base}.dot", dot)
+    return dot
 
-    os.system(f"dot -Tsvg -o{OPT.output}/{base}.svg {OPT.output}/{base}.dot")
 
+def write_map(base, title, leads_to, svg, negate=False):
+    """Output HTML containing SVG graph of assets, see write_maps()"""
+    top = ''
     generated = title.split(' updated ')[-1]
     subset = 'All assets' if base == 'index' else f'{leads_to} assets only'
     if negate:
         subset = f"Assets not leading to an asset of type {leads_to}"
 
-    svg = open(f"{OPT.output}/{base}.svg").read()
     asset_map = asset_to_svg(svg)
     context = dict(
         title=title,
@@ -943,85 +1304,139 @@ def write_map(base, assets, issues, title, leads_to, in_field, negate=False):
         subset=subset,
         theme=OPT.theme,
     )
-    with open(f"{OPT.output}/{base}.html", 'w') as out:
-        out.write(get_jinja().get_template("map.html").render(context))
+    WRITER.write(
+        f"{OPT.output}/{base}.html",
+        get_template("map.html").render(context),
+    )
+
 
+def generate_all(opt, variants=None):
+    """Generate all outputs based on command line options
 
-def generate_all(opt):
-    """Generate all outputs based on command line options"""
-    OPT.output = opt.output
-    OPT.theme = DARK_THEME if opt.theme == 'dark' else LIGHT_THEME
+    `variants` is an optional list of (theme, output folder) pairs, to
+    generate outputs for several themes from one load / validation of the
+    assets.  Defaults to [(opt.theme, opt.output)].
+    """
     assets, archived, lookup, issues = prep_assets(opt)
+    variants = variants or [(opt.theme, opt.output)]
+    if len(variants) == 1:
+        generate_theme(opt, *variants[0], assets, archived, lookup, issues)
+        return
+    # themes are independent, CPU bound, so use a process each
+    with ProcessPoolExecutor(len(variants), mp_context=MP_CONTEXT) as pool:
+        jobs = [
+            pool.submit(
+                generate_theme,
+                opt,
+                theme,
+                output,
+                assets,
+                archived,
+                lookup,
+                issues,
+            )
+            for theme, output in variants
+        ]
+        for job in jobs:
+            job.result()  # re-raise any exception
+
+
+def generate_theme(opt, theme, output, assets, archived, lookup, issues):
+    """Generate outputs for one theme, see generate_all()"""
+    OPT.output = output
+    OPT.theme = DARK_THEME if theme == 'dark' else LIGHT_THEME
     generate_outputs(opt, assets, archived, lookup, issues)
 
 
 def prep_assets(opt):
     assets = []
-    for asset_file in chain.from_iterable(opt.assets):
+    asset_files = list(chain.from_iterable(opt.assets))
+    preload_yaml(asset_files)
+    # read files concurrently, but collect assets in command line order
+    with ThreadPoolExecutor() as pool:
+        loading = [pool.submit(load_assets, i) for i in asset_files]
+    for asset_file, loaded in zip(asset_files, loading):
         try:
-            assets.extend(load_assets(asset_file))
+            assets.extend(loaded.result())
         except Exception:
             print(f"Failed reading {asset_file}")
             raise
 
     # separate archived assets
-    archived = [i for i in assets if 'archived' in i.get('tags', [])]
-    assets = [i for i in assets if 'archived' not in i.get('tags', [])]
+    archived = []
+    current = []
+    for asset in assets:
+        if 'archived' in asset.get('tags', ()):
+            archived.append(asset)
+        else:
+            current.append(asset)
+    assets = current
 
-    VALIDATORS_COMPILED.update(
-        {re.compile(k): v for k, v in VALIDATORS.items()}
-    )
-    issues = validate_assets(assets)
+    dependents = dependents_index(assets)
+    issues = validate_assets(assets, dependents)
     for asset in assets + archived:
         asset['_reppath'] = html_filename(asset)
         asset['_edit_url'] = edit_url(asset)
+        asset['_link_text'] = (
+            f"{asset.get('type', '')}:{asset.get('name', '')}"
+        )
         asset['_dep_types'] = dep_types(asset)
         if asset['id'] in issues:
             asset['_class'] = 'issues'
 
     # add _dependent_types to each asset listing types of all dependents
-    propagate_dependent(assets, output='_dependent_types', field='type')
-    propagate_dependent(assets, output='_dependent_ids', field='id')
+    propagate_dependent(
+        assets,
+        (('_dependent_types', 'type'), ('_dependent_ids', 'id')),
+        dependents,
+    )
     lookup = {i['id']: i for i in assets}
     for asset in assets:
-        asset.setdefault('_dependents', [])  # so they all have it
-        for dep in asset_dep_ids(asset):
-            if dep in lookup:
-                lookup[dep].setdefault('_dependents', []).append(asset['id'])
+        # once each, an asset may list a dependency more than once
+        asset['_dependents'] = list(
+            dict.fromkeys(dependents.get(asset['id'], []))
+        )
 
     return assets, archived, lookup, issues
 
 
 def generate_outputs(opt, assets, archived, lookup, issues):
 
-    title = get_title(assets)
-    os.makedirs(OPT.output, exist_ok=True)
-    for asset in assets:  # after all dependents recorded
-        report_to_html(asset, lookup, issues, title)
-    for asset in archived:
-        asset.setdefault('_dependents', [])  # even these
-    for asset in archived:
-        report_to_html(asset, lookup, issues, title)
-
-    write_reports(assets, issues, title, archived)
-
-    if opt.leaf_type:
-        n = len(assets)
-        use = [
-            i
-            for i in assets
-            if any(
-                re.search(opt.leaf_type, j)
-                for j in (i.get('_dependent_types') or [])
-            )
-        ]
-        if opt.leaf_negate:
-            assets = [i for i in assets if i not in use]
-        else:
-            assets = use
-        print(f"Showing {len(assets)} of {n} assets")
-
-    write_maps(assets, issues, title)
+    try:
+        title = get_title(assets)
+        os.makedirs(OPT.output, exist_ok=True)
+        for asset in assets:  # after all dependents recorded
+            report_to_html(asset, lookup, issues, title)
+        for asset in archived:
+            asset.setdefault('_dependents', [])  # even these
+        for asset in archived:
+            report_to_html(asset, lookup, issues, title)
+
+        write_reports(assets, issues, title, archived, lookup)
+
+        if opt.leaf_type:
+            n = len(assets)
+            leaf_re = re.compile(opt.leaf_type)
+            use = [
+                i
+                for i in assets
+                if any(
+                    leaf_re.search(j)
+                    for j in (i.get('_dependent_types') or [])
+                )
+            ]
+            if opt.leaf_negate:
+                use_ids = {i['id'] for i in use}
+                assets = [i for i in assets if i['id'] not in use_ids]
+            else:
+                assets = use
+            print(f"Showing {len(assets)} of {n} assets")
+
+        write_maps(assets, issues, title)
+    finally:
+        # queued files are written, and write errors raised, even if this
+        # run fails, so they're not left for the next run's flush()
+        WRITER.flush()
 
 
 def main():